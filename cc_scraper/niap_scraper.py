@@ -1,6 +1,7 @@
 
 from __future__ import annotations
 import asyncio
+import csv
 import os
 import json
 import time
@@ -9,10 +10,30 @@ from dataclasses import dataclass, asdict
 
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 
-from .utils import normalize_label, squash_ws, FIELD_ALIASES
+from .utils import normalize_label, squash_ws
 
 TARGET_URL = os.environ.get("NIAP_URL", "https://www.niap-ccevs.org/products")
 
+# Headless-scraper friendly Chromium flags
+LAUNCH_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-features=IsolateOrigins,site-per-process",
+]
+
+# Only the hydrated grid data is needed; skip everything that is just paint
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+
+def _route_filter(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        route.abort()
+    else:
+        route.continue_()
+
 CANON_FIELDS = [
     "VID",
     "Vendor",
@@ -26,7 +47,7 @@ CANON_FIELDS = [
     "Scheme",
 ]
 
-@dataclass
+@dataclass(slots=True)
 class Record:
     VID: str | None = None
     Vendor: str | None = None
@@ -57,20 +78,21 @@ class Record:
         }
         return d
 
+# innerText of every matched element with whitespace runs collapsed (JS equivalent of squash_ws)
+_SQUASHED_TEXTS_JS = "els => els.map(e => (e.innerText || '').replace(/\\s+/g, ' ').trim())"
+
 def _extract_fields_from_card(el) -> Dict[str, str]:
     # Try common patterns seen on NIAP product cards/details
     data: Dict[str, str] = {}
     # Strategy 1: definition list style (dt/dd)
-    dts = el.locator("dt")
-    dds = el.locator("dd")
-    if dts.count() and dds.count() and dts.count() == dds.count():
-        for i in range(dts.count()):
-            label = normalize_label(squash_ws(dts.nth(i).inner_text()))
-            value = squash_ws(dds.nth(i).inner_text())
-            data[label] = value
+    # (whitespace is collapsed in the renderer, one pass per column)
+    dt_texts = el.locator("dt").evaluate_all(_SQUASHED_TEXTS_JS)
+    dd_texts = el.locator("dd").evaluate_all(_SQUASHED_TEXTS_JS)
+    if dt_texts and dd_texts and len(dt_texts) == len(dd_texts):
+        for lbl, val in zip(dt_texts, dd_texts):
+            data[normalize_label(lbl)] = val
     else:
         # Strategy 2: key spans/strong: value pairs
-        rows = el.locator("css=*:text-matches('.*', 'i')")
         # We'll scan leaf nodes for label:value patterns
         try:
             inner = el.inner_text()
@@ -87,8 +109,6 @@ def _extract_fields_from_card(el) -> Dict[str, str]:
     return data
 
 def scrape_page(page, results: List[Record]) -> None:
-    # The grid loads dynamically; ensure content is present
-    page.wait_for_load_state("networkidle")
     # Try to find item cards (several likely selectors)
     selectors = [
         "[data-testid='product-card']",
@@ -96,6 +116,11 @@ def scrape_page(page, results: List[Record]) -> None:
         "div.card:has-text('VID')",
         ".product-card, .card, .grid > div",
     ]
+    # The grid loads dynamically; wait until any candidate card is present
+    try:
+        page.locator(", ".join(selectors)).first.wait_for(timeout=10_000)
+    except PWTimeoutError:
+        pass
     cards = None
     for sel in selectors:
         loc = page.locator(sel)
@@ -117,21 +142,11 @@ def scrape_page(page, results: List[Record]) -> None:
         card = cards.nth(i)
         fields = _extract_fields_from_card(card)
         rec = Record()
-        # Map fields
+        # Map fields (labels are already canonicalized by normalize_label)
         for f in CANON_FIELDS:
-            v = None
-            # try canonical
-            if f in fields:
-                v = fields[f]
-            else:
-                # try aliases
-                for alias in FIELD_ALIASES.get(f, []):
-                    if alias in fields:
-                        v = fields[alias]
-                        break
+            v = fields.get(f)
             if v:
-                key = f.replace(" ", "_")
-                setattr(rec, key if key != "Conformance_Claims" else "Conformance_Claims", v)
+                setattr(rec, f.replace(" ", "_"), v)
         # Try to grab a URL if present
         link = card.locator("a:has-text('Details'), a[href*='/products/']")
         if link.count():
@@ -144,8 +159,9 @@ def scrape_page(page, results: List[Record]) -> None:
 def run(headless: bool = True, out_csv: str = "output/niap_products.csv", out_jsonl: str = "output/niap_products.jsonl") -> int:
     results: List[Record] = []
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
+        browser = p.chromium.launch(headless=headless, args=LAUNCH_ARGS)
         context = browser.new_context()
+        context.route("**/*", _route_filter)
         page = context.new_page()
         page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=120000)
         # If there is pagination, attempt to iterate
@@ -166,7 +182,6 @@ def run(headless: bool = True, out_csv: str = "output/niap_products.csv", out_js
                         break
                     seen.add(key)
                     next_btn.first.click()
-                    page.wait_for_load_state("networkidle")
                     page.wait_for_timeout(1000)
                     scrape_page(page, results)
                     has_next = True
@@ -175,16 +190,14 @@ def run(headless: bool = True, out_csv: str = "output/niap_products.csv", out_js
 
     # Write files
     os.makedirs(os.path.dirname(out_csv), exist_ok=True)
-    import csv
-    with open(out_csv, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=list(Record().to_dict().keys()))
+    with open(out_csv, "w", newline="", encoding="utf-8") as f_csv, \
+         open(out_jsonl, "w", encoding="utf-8") as f_jsonl:
+        w = csv.DictWriter(f_csv, fieldnames=list(Record().to_dict().keys()))
         w.writeheader()
         for r in results:
-            w.writerow(r.to_dict())
-
-    with open(out_jsonl, "w", encoding="utf-8") as f:
-        for r in results:
-            f.write(json.dumps(r.to_dict(), ensure_ascii=False) + "\n")
+            d = r.to_dict()
+            w.writerow(d)
+            f_jsonl.write(json.dumps(d, ensure_ascii=False) + "\n")
 
     print(f"Saved {len(results)} records to {out_csv} and {out_jsonl}")
     return len(results)
@@ -1,8 +1,11 @@
 
 from __future__ import annotations
 import re
+from functools import lru_cache
 from typing import Dict, List
 
+_WS_RE = re.compile(r"\s+")
+
 FIELD_ALIASES: Dict[str, List[str]] = {
     "VID": ["VID", "Validation ID", "VPL ID", "Validation Identifier"],
     "Vendor": ["Vendor", "Manufacturer"],
@@ -16,13 +19,15 @@ FIELD_ALIASES: Dict[str, List[str]] = {
     "Scheme": ["Scheme", "Country"],
 }
 
+# Case-folded alias -> canonical name, built once at import time
+_ALIAS_MAP: Dict[str, str] = {
+    a.lower(): canonical for canonical, aliases in FIELD_ALIASES.items() for a in aliases
+}
+
+@lru_cache(maxsize=256)
 def normalize_label(label: str) -> str:
     label = (label or "").strip()
-    for canonical, aliases in FIELD_ALIASES.items():
-        for a in aliases:
-            if a.lower() == label.lower():
-                return canonical
-    return label
+    return _ALIAS_MAP.get(label.lower(), label)
 
 def squash_ws(text: str) -> str:
-    return re.sub(r"\s+", " ", (text or "")).strip()
+    return _WS_RE.sub(" ", (text or "")).strip()
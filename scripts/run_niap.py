@@ -1,11 +1,35 @@
 # cc_scraper/niap_scraper.py
 from __future__ import annotations
-import os, csv, json, re
-from typing import List, Dict, Optional, Tuple, Set
+import asyncio, os, csv, re, time
+import orjson
+from typing import Iterator, List, Dict, Optional, Tuple, Set, Union
 from dataclasses import dataclass
-from playwright.sync_api import sync_playwright
+from functools import lru_cache
+from playwright.async_api import async_playwright
 
 TARGET_URL = os.environ.get("NIAP_URL", "https://www.niap-ccevs.org/products")
+# Cookies/localStorage saved between runs (skips the banner + session setup next time)
+STATE_PATH = os.environ.get("NIAP_STATE", "niap_state.json")
+
+# Headless-scraper friendly Chromium flags
+LAUNCH_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-features=IsolateOrigins,site-per-process",
+]
+
+# Only the hydrated grid data is needed; skip everything that is just paint
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+
+async def _route_filter(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
 REQUIRED_HEADERS = [
     "VID","Vendor","Product","CCTL","Certification Date","Status",
@@ -20,14 +44,18 @@ ALIASES = {
     "maintenance update":"Maintenance Update","scheme":"Scheme",
 }
 
+_OF_RE = re.compile(r"\bof\s+(\d{1,7})\b")
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
 def norm(s: Optional[str]) -> str:
     return " ".join((s or "").split()).strip()
 
+@lru_cache(maxsize=256)
 def to_canonical(header: str) -> Optional[str]:
     h = norm(header).lower()
     return ALIASES.get(h)
 
-@dataclass
+@dataclass(slots=True)
 class Row:
     VID: str = ""; Vendor: str = ""; Product: str = ""; CCTL: str = ""
     Certification_Date: str = ""; Status: str = ""
@@ -44,52 +72,77 @@ class Row:
             "product_url": self.Product_URL,
         }
 
+# Output column order, taken from Row.to_dict (the single definition of the output schema)
+_FIELD_KEYS = tuple(Row().to_dict())
+
 # ---------- grid helpers ----------
-def _find_grid(page):
-    for sel in ["div[role='grid']","div.MuiDataGrid-root","div.MuiDataGrid-main","table"]:
+@dataclass
+class _LocatorCache:
+    """Winning selector per probe helper (one per run); re-probed only when it stops matching."""
+    grid_sel: Optional[str] = None
+    next_sel: Optional[str] = None
+
+_GRID_SELECTORS = ["div[role='grid']","div.MuiDataGrid-root","div.MuiDataGrid-main","table"]
+
+async def _find_grid(page, cache: _LocatorCache):
+    if cache.grid_sel:
+        loc = page.locator(cache.grid_sel)
+        if await loc.count():
+            return loc.first
+    for sel in _GRID_SELECTORS:
         loc = page.locator(sel)
-        if loc.count():
+        if await loc.count():
+            cache.grid_sel = sel
             return loc.first
+    cache.grid_sel = None
     return None
 
-def _get_headers(page, grid):
-    header_cells = page.get_by_role("columnheader")
-    if header_cells.count() == 0:
-        header_cells = grid.locator("thead tr th")
+async def _get_headers(page, grid):
+    header_cells = page.locator("[role=columnheader]")
+    if await header_cells.count() == 0:
+        header_cells = grid.locator("thead th")
     index_to_name = {}
-    for i in range(header_cells.count()):
-        txt = norm(header_cells.nth(i).inner_text())
+    for i, txt in enumerate(await header_cells.all_inner_texts()):
+        txt = norm(txt)
         canon = to_canonical(txt)
         if canon:
             index_to_name[i] = canon
     return index_to_name
 
-def _rows_locator(page):
-    return page.locator("div[role='row']").filter(has_not=page.locator("div[role='columnheader']"))
-
-def _grid_scroller(page):
+async def _grid_scroller(page):
     loc = page.locator("div.MuiDataGrid-virtualScroller").first
-    return loc if loc.count() else None
+    return loc if await loc.count() else None
 
-def _scroll_grid_to_end(page, pause_ms: int = 120, repeats: int = 10):
+async def _scroll_grid_to_end(page, pause_ms: int = 120, repeats: int = 10):
     """Scroll INSIDE the grid (not the window) so virtualized rows render."""
-    scroller = _grid_scroller(page)
+    scroller = await _grid_scroller(page)
     if scroller:
         for _ in range(repeats):
-            scroller.evaluate("(el) => { el.scrollTop = el.scrollHeight }")
-            page.wait_for_timeout(pause_ms)
+            await scroller.evaluate("(el) => { el.scrollTop = el.scrollHeight }")
+            await page.wait_for_timeout(pause_ms)
     else:
         for _ in range(repeats):
-            page.mouse.wheel(0, 2000); page.wait_for_timeout(pause_ms)
+            await page.mouse.wheel(0, 2000); await page.wait_for_timeout(pause_ms)
+
+# Grid loading overlay/spinner; present while a page's data is still being fetched
+_LOADING_SEL = "div.MuiDataGrid-overlay, .MuiCircularProgress-root"
+
+async def _wait_for_grid_loaded(page, timeout_ms: int = 10_000):
+    """Wait for the grid's loading overlay/spinner to go away (cheaper than networkidle)."""
+    try:
+        await page.locator(_LOADING_SEL).first.wait_for(
+            state="detached", timeout=timeout_ms)
+    except Exception:
+        pass
 
-def _get_total_from_pager(page) -> Optional[int]:
+async def _get_total_from_pager(page) -> Optional[int]:
     # Parse "1–250 of 277"
     sels = ["div.MuiTablePagination-displayedRows","[class*='MuiTablePagination-displayedRows']","[aria-live='polite']","div[role='status']"]
     for s in sels:
         loc = page.locator(s)
-        for i in range(min(3, loc.count())):
-            txt = (loc.nth(i).inner_text() or "").strip()
-            m = re.search(r"\bof\s+(\d{1,7})\b", txt)
+        for i in range(min(3, await loc.count())):
+            txt = (await loc.nth(i).inner_text() or "").strip()
+            m = _OF_RE.search(txt)
             if m:
                 try:
                     return int(m.group(1))
@@ -97,65 +150,155 @@ def _get_total_from_pager(page) -> Optional[int]:
                     pass
     return None
 
-def _set_page_size_to_max(page):
+async def _set_page_size_to_max(page):
     try:
-        combos = page.get_by_role("combobox")
         target = None
-        for i in range(combos.count()):
-            al = ((combos.nth(i).get_attribute("aria-label") or "") + " " +
-                  (combos.nth(i).get_attribute("aria-labelledby") or "")).lower()
-            if "rows per page" in al:
-                target = combos.nth(i); break
-        if not target and combos.count():
-            target = combos.first
-        if target and target.is_visible():
-            target.click(); page.wait_for_timeout(200)
-            options = page.get_by_role("option")
-            if options.count() == 0:
-                options = page.get_by_role("menuitem")
+        labelled = page.locator("[role=combobox][aria-label*='rows per page' i], "
+                                "[role=combobox][aria-labelledby*='rows per page' i], "
+                                "select[aria-label*='rows per page' i], "
+                                "select[aria-labelledby*='rows per page' i]")
+        if await labelled.count():
+            target = labelled.first
+        else:
+            combos = page.locator("[role=combobox], select")
+            if await combos.count():
+                target = combos.first
+        if target and await target.is_visible():
+            if await target.evaluate("(el) => el.tagName === 'SELECT'"):
+                # Native <select>: options can't be clicked, pick by label instead
+                labels = await target.locator("option").all_inner_texts()
+                nums = [int("".join(ch for ch in t if ch.isdigit()) or "0") for t in labels]
+                if nums and max(nums) > 0:
+                    await target.select_option(label=labels[nums.index(max(nums))])
+                    await page.wait_for_timeout(400)
+                    return True
+                return False
+            await target.click(); await page.wait_for_timeout(200)
+            options = page.locator("[role=option], option")
+            if await options.count() == 0:
+                options = page.locator("[role=menuitem]")
             best = None; best_val = -1
-            for i in range(options.count()):
-                txt = (options.nth(i).inner_text() or "").strip()
+            for i in range(await options.count()):
+                txt = (await options.nth(i).inner_text() or "").strip()
                 num = int("".join(ch for ch in txt if ch.isdigit()) or "0")
                 if num > best_val:
                     best_val = num; best = options.nth(i)
             if best and best_val > 0:
-                best.click(); page.wait_for_timeout(400)
+                await best.click(); await page.wait_for_timeout(400)
                 return True
     except Exception:
         pass
     return False
 
 # ---------- extraction (dedupe by Product, with fallbacks) ----------
-def _extract_rows(page, grid, index_to_name, seen_products: Set[str]) -> List[Row]:
+# Walks every data row in one renderer-side pass (one IPC call per page instead of
+# one per cell). `hdr` is a list of [cell_index, canonical_name] pairs.
+_HARVEST_JS = """
+(el, hdr) => {
+    let rows = Array.from(el.querySelectorAll('div[role="row"]'))
+        .filter(r => !r.querySelector('div[role="columnheader"]'));
+    if (!rows.length) rows = Array.from(el.querySelectorAll('tbody tr'));
+    const productIdx = (hdr.find(([_, k]) => k === 'Product') || [])[0];
+    const out = [];
+    for (const r of rows) {
+        let cells = r.querySelectorAll('[role="gridcell"]');
+        if (!cells.length) cells = r.querySelectorAll('td');
+        if (!cells.length) continue;
+        const o = {};
+        for (const [i, k] of hdr) {
+            o[k] = ((cells[i] && cells[i].innerText) || '').replace(/\\s+/g, ' ').trim();
+        }
+        const a = productIdx !== undefined && cells[productIdx] ? cells[productIdx].querySelector('a') : null;
+        o.__url = a ? (a.getAttribute('href') || '') : '';
+        out.push(o);
+    }
+    return out;
+}
+"""
+
+# Pager "x–y of N" text (first data row's text if there is no pager); changes on every page turn
+_SNAPSHOT_JS = """
+() => {
+    const p = document.querySelector('[class*="MuiTablePagination-displayedRows"]');
+    if (p && p.innerText.trim()) return p.innerText;
+    const c = document.querySelector('[role="gridcell"], tbody td');
+    return c && c.parentElement ? c.parentElement.innerText : '';
+}
+"""
+
+# Same harvest, but pages through the grid inside the renderer: harvest, click Next,
+# wait (MutationObserver) for the pager snapshot to change, repeat. Returns all pages'
+# rows plus `done` (true once Next is missing/disabled, i.e. the last page was reached).
+_HARVEST_ALL_JS = """
+async (el, [hdr, nextSels, gridSels, maxPages]) => {
+    const harvest = """ + _HARVEST_JS + """;
+    const snapshot = """ + _SNAPSHOT_JS + """;
+    const sleep = ms => new Promise(res => setTimeout(res, ms));
+    const nextBtn = () => {
+        for (const s of nextSels) { const b = document.querySelector(s); if (b) return b; }
+        return null;
+    };
+    // Re-resolve the grid each page (same order as _find_grid) in case its root is re-rendered
+    const findGrid = () => {
+        for (const s of gridSels) { const g = document.querySelector(s); if (g) return g; }
+        return el;
+    };
+    // Wait for the loading overlay to go (the pager label flips before the new rows
+    // arrive), then for the row count to hold steady
+    const settle = async () => {
+        let prev = -1, stable = 0;
+        const deadline = Date.now() + 5000;
+        while (Date.now() < deadline && document.querySelector('""" + _LOADING_SEL + """')) {
+            await sleep(50);
+        }
+        while (Date.now() < deadline) {
+            const sc = document.querySelector('div.MuiDataGrid-virtualScroller');
+            if (sc) sc.scrollTop = sc.scrollHeight;
+            const cur = document.querySelectorAll('[role="row"]').length;
+            if (cur === prev && cur > 1) { if (++stable >= 2) break; } else { stable = 0; }
+            prev = cur;
+            await sleep(80);
+        }
+    };
+    const rows = [];
+    let done = false;
+    for (let page = 0; ; page++) {
+        await settle();
+        rows.push(...harvest(findGrid(), hdr));
+        const btn = nextBtn();
+        if (!btn || btn.disabled || btn.classList.contains('Mui-disabled')) { done = true; break; }
+        if (page >= maxPages) break;
+        const before = snapshot();
+        btn.click();
+        const changed = await new Promise(res => {
+            let mo, timer;
+            const finish = ok => { mo.disconnect(); clearTimeout(timer); res(ok); };
+            mo = new MutationObserver(() => { if (snapshot() !== before) finish(true); });
+            timer = setTimeout(() => finish(false), 10000);
+            mo.observe(document.body, {subtree: true, childList: true, characterData: true});
+        });
+        if (!changed) break;
+    }
+    return {rows, done};
+}
+"""
+
+async def _harvest_rows(grid, index_to_name) -> List[Dict[str, str]]:
+    return await grid.evaluate(_HARVEST_JS, list(index_to_name.items()))
+
+async def _harvest_all_pages(grid, index_to_name, cache: _LocatorCache, max_pages: int = 100) -> Tuple[List[Dict[str, str]], bool]:
+    """All pages' raw rows, and whether the last page was reached."""
+    next_sels = ([cache.next_sel] if cache.next_sel else []) + _NEXT_BTN_SELECTORS
+    grid_sels = ([cache.grid_sel] if cache.grid_sel else []) + _GRID_SELECTORS
+    res = await grid.evaluate(_HARVEST_ALL_JS, [list(index_to_name.items()), next_sels, grid_sels, max_pages])
+    return res["rows"], bool(res["done"])
+
+def _extract_rows(raw_rows: List[Dict[str, str]], seen_products: Set[Union[str, int]]) -> Iterator[Row]:
     """
-    Dedup key preference: Product (normalized, lowercase) -> Product_URL -> full row string.
+    Yield new Rows only. Dedup key preference: Product (normalized, lowercase) -> Product_URL -> hash of all values.
     """
-    rows: List[Row] = []
-    data_rows = _rows_locator(page)
-    if data_rows.count() == 0:
-        data_rows = grid.locator("tbody tr")
-
-    for r_i in range(data_rows.count()):
-        row_loc = data_rows.nth(r_i)
-        cells = row_loc.get_by_role("gridcell")
-        if cells.count() == 0:
-            cells = row_loc.locator("td")
-        if cells.count() == 0:
-            continue
-
-        # First pass: collect all values so we can form the key from Product
-        values: Dict[str, str] = {}
-        product_url = ""
-        for c_i in range(cells.count()):
-            key = index_to_name.get(c_i)
-            val = norm(cells.nth(c_i).inner_text())
-            if key == "Product":
-                link = cells.nth(c_i).locator("a")
-                if link.count():
-                    product_url = link.first.get_attribute("href") or ""
-            if key:
-                values[key] = val
+    for values in raw_rows:
+        product_url = values.get("__url", "")
 
         # Build dedupe key
         product_key = values.get("Product", "")
@@ -165,9 +308,8 @@ def _extract_rows(page, grid, index_to_name, seen_products: Set[str]) -> List[Ro
             if product_url:
                 key_norm = f"url::{product_url.strip().lower()}"
             else:
-                # last resort: whole row joined
-                all_text = " | ".join(values.get(k, "") for k in REQUIRED_HEADERS)
-                key_norm = f"row::{norm(all_text).lower()}"
+                # last resort: hash of the whole row (values are already whitespace-normalized)
+                key_norm = hash(tuple(values.get(k, "") for k in REQUIRED_HEADERS))
 
         if key_norm in seen_products:
             continue
@@ -187,122 +329,274 @@ def _extract_rows(page, grid, index_to_name, seen_products: Set[str]) -> List[Ro
             Scheme=values.get("Scheme",""),
             Product_URL=product_url,
         )
-        rows.append(rec)
+        yield rec
+
+# ---------- JSON feed capture (skips DOM pagination when the grid's data is seen) ----------
+def _api_key_to_canonical(key) -> Optional[str]:
+    # "certification_date" / "certificationDate" -> "certification date"
+    k = _CAMEL_RE.sub(" ", str(key)).replace("_", " ")
+    return to_canonical(k)
+
+def _api_record_values(rec: Dict) -> Dict[str, str]:
+    values: Dict[str, str] = {}
+    for k, v in rec.items():
+        canon = _api_key_to_canonical(k)
+        if canon and isinstance(v, (str, int, float)):
+            values[canon] = norm(str(v))
+    return values
+
+def _find_api_rows(payload, depth: int = 0) -> Optional[List[Dict[str, str]]]:
+    """Return the first list of records in a JSON payload whose keys map onto the grid headers."""
+    if depth > 4:
+        return None
+    if isinstance(payload, list):
+        if payload and all(isinstance(x, dict) for x in payload[:5]):
+            rows = [_api_record_values(x) for x in payload if isinstance(x, dict)]
+            if len(rows[0]) >= 3:
+                return rows
+        return None
+    if isinstance(payload, dict):
+        for v in payload.values():
+            found = _find_api_rows(v, depth + 1)
+            if found:
+                return found
+    return None
 
-    return rows
+def _api_rows_match_grid(api_rows: List[Dict[str, str]], page_rows: List[Dict[str, str]],
+                         index_to_name: Dict[int, str], total: int) -> bool:
+    """
+    Accept the captured feed only if it is exactly the grid's dataset: same record count as
+    the pager, every grid column present with a VID and Product, and the rendered page's rows
+    (which must carry no product links, the feed has none) reproduced value for value.
+    """
+    if not total or len(api_rows) != total:
+        return False
+    cols = set(index_to_name.values())
+    for rec in api_rows:
+        if not cols.issubset(rec) or not rec.get("VID") or not rec.get("Product"):
+            return False
+    by_vid = {rec["VID"]: rec for rec in api_rows}
+    for row in page_rows:
+        rec = by_vid.get(row.get("VID", ""))
+        if row.get("__url") or rec is None or any(rec[c] != row.get(c, "") for c in cols):
+            return False
+    return bool(page_rows)
 
 # ---------- pager helpers (arrows only UI) ----------
-def _pager_next_btn(page):
-    for s in [
-        "button[title='Next page']",
-        "button[aria-label='Go to next page']",
-        "button[aria-label*='Next']",
-        "button.MuiPaginationItem-previousNext[aria-label*='Next']",
-    ]:
+_NEXT_BTN_SELECTORS = [
+    "button[title='Next page']",
+    "button[aria-label='Go to next page']",
+    "button[aria-label*='Next']",
+    "button.MuiPaginationItem-previousNext[aria-label*='Next']",
+]
+
+async def _pager_next_btn(page, cache: _LocatorCache):
+    if cache.next_sel:
+        loc = page.locator(cache.next_sel).first
+        if await loc.count():
+            return loc
+    for s in _NEXT_BTN_SELECTORS:
         loc = page.locator(s).first
-        if loc.count():
+        if await loc.count():
+            cache.next_sel = s
             return loc
+    cache.next_sel = None
     return None
 
-def _is_disabled(btn) -> bool:
+async def _is_disabled(btn) -> bool:
     try:
-        if not btn or not btn.count():
+        if not btn or not await btn.count():
             return True
-        return (not btn.is_enabled()) or ("Mui-disabled" in (btn.get_attribute("class") or ""))
+        return (not await btn.is_enabled()) or ("Mui-disabled" in (await btn.get_attribute("class") or ""))
     except Exception:
         return True
 
+async def _grid_snapshot(page) -> str:
+    try:
+        return await page.evaluate(_SNAPSHOT_JS)
+    except Exception:
+        return ""
+
+async def _advance_page(page, next_btn, before: str, change_timeout_s: float = 10.0,
+                        timeout_s: float = 5.0) -> bool:
+    """
+    Click Next, wait until the grid snapshot differs from `before` (the new page's data
+    is in), then until the row count is stable for 2 polls. False if the page never changed.
+    """
+    await next_btn.click()
+    deadline = time.monotonic() + change_timeout_s
+    while await _grid_snapshot(page) == before:
+        if time.monotonic() >= deadline:
+            return False
+        await page.wait_for_timeout(50)
+    await _wait_for_grid_loaded(page)
+    prev_count = -1; stable = 0
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        cur = await page.locator("[role=row]").count()
+        if cur == prev_count and cur > 1:
+            stable += 1
+            if stable >= 2:
+                break
+        else:
+            stable = 0
+        prev_count = cur
+        await _scroll_grid_to_end(page, pause_ms=40, repeats=1)
+        await page.wait_for_timeout(80)
+    return True
+
+async def _goto_products(page):
+    await page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=120_000)
+    await page.locator("[role=columnheader]:has-text('VID')").first.wait_for(state="visible", timeout=60_000)
+
+async def _prepare_first_page(page):
+    # Max rows/page if possible
+    try: await _set_page_size_to_max(page)
+    except Exception: pass
+
+    # Ensure first page fully rendered
+    await _scroll_grid_to_end(page)
+
 # --------------- main ----------------
-def run(headless: bool = True,
-        out_csv: str = "output/niap_products.csv",
-        out_jsonl: str = "output/niap_products.jsonl") -> int:
+async def run_async(headless: bool = True,
+                    out_csv: str = "output/niap_products.csv",
+                    out_jsonl: str = "output/niap_products.jsonl") -> int:
     os.makedirs(os.path.dirname(out_csv), exist_ok=True)
     os.makedirs(os.path.dirname(out_jsonl), exist_ok=True)
 
-    all_rows: List[Row] = []
-    seen_products: Set[str] = set()
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        ctx = browser.new_context()
-        page = ctx.new_page()
-
-        page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=120_000)
-        page.wait_for_load_state("networkidle")
-        page.get_by_role("columnheader", name="VID").first.wait_for(state="visible", timeout=60_000)
-
-        # Best-effort: dismiss cookie/banner
-        for txt in ["Accept","I Agree","Got it","Close"]:
-            try:
-                b = page.get_by_role("button", name=txt).first
-                if b and b.is_visible():
-                    b.click(); page.wait_for_timeout(250)
-            except Exception:
-                pass
-
-        grid = _find_grid(page)
-        if not grid: raise RuntimeError("Could not locate the products grid/table.")
-        header_map = _get_headers(page, grid)
-        if not header_map: raise RuntimeError("Could not read column headers; grid structure may have changed.")
-
-        # Max rows/page if possible
-        try: _set_page_size_to_max(page)
-        except Exception: pass
-
-        # Ensure first page fully rendered
-        _scroll_grid_to_end(page)
-
-        total = _get_total_from_pager(page) or 0
-
-        # Collect the current page
-        def collect_current():
-            nonlocal all_rows, grid, header_map
-            _scroll_grid_to_end(page)
-            grid = _find_grid(page) or grid
-            batch = _extract_rows(page, grid, header_map, seen_products)
-            all_rows.extend(batch)
-
-        collect_current()
-
-        # Click Next until disabled; collect after each advance
-        next_btn = _pager_next_btn(page)
-        safety = 0
-        while next_btn and not _is_disabled(next_btn):
-            safety += 1
-            if safety > 100:  # guard
-                break
-            next_btn.click()
-            for _ in range(10):
-                page.wait_for_timeout(120)
-                _scroll_grid_to_end(page, pause_ms=40, repeats=1)
-            collect_current()
-            next_btn = _pager_next_btn(page)
-            if total and len(seen_products) >= total:
-                break
+    seen_products: Set[Union[str, int]] = set()
+    locators = _LocatorCache()
+    written = 0
+
+    # Rows are streamed to .part files as they are extracted (only dedupe keys stay in
+    # memory); the previous output is replaced only once the scrape has finished
+    csv_part, jsonl_part = out_csv + ".part", out_jsonl + ".part"
+    with open(csv_part, "w", newline="", encoding="utf-8", buffering=1 << 20) as csv_f, \
+         open(jsonl_part, "wb", buffering=1 << 20) as jsonl_f:
+        writer = csv.writer(csv_f)
+        writer.writerow(_FIELD_KEYS)
+
+        def write_rows(rows):
+            nonlocal written
+            for r in rows:
+                d = r.to_dict()
+                writer.writerow(d.values())
+                jsonl_f.write(orjson.dumps(d) + b"\n")
+                written += 1
+
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=headless, args=LAUNCH_ARGS)
+            ctx = None
+            if os.path.exists(STATE_PATH):
+                try: ctx = await browser.new_context(storage_state=STATE_PATH)
+                except Exception: print(f"Ignoring unreadable storage state {STATE_PATH}")
+            if ctx is None:
+                ctx = await browser.new_context()
+            await ctx.route("**/*", _route_filter)
+            page = await ctx.new_page()
+
+            # The grid hydrates from a JSON endpoint; keep the largest record list seen
+            api_rows: List[Dict[str, str]] = []
+            async def on_response(resp):
+                if "json" not in (resp.headers.get("content-type") or ""):
+                    return
+                try:
+                    found = _find_api_rows(await resp.json())
+                except Exception:
+                    return
+                if found and len(found) > len(api_rows):
+                    api_rows[:] = found
+            page.on("response", on_response)
+
+            await _goto_products(page)
+
+            # Best-effort: dismiss cookie/banner
+            for txt in ["Accept","I Agree","Got it","Close"]:
+                try:
+                    b = page.locator(f"button:has-text('{txt}')").first
+                    if b and await b.is_visible():
+                        await b.click(); await page.wait_for_timeout(250)
+                except Exception:
+                    pass
 
-        # Extra collect on final page (some UIs need one more render)
-        collect_current()
+            grid = await _find_grid(page, locators)
+            if not grid: raise RuntimeError("Could not locate the products grid/table.")
+            header_map = await _get_headers(page, grid)
+            if not header_map: raise RuntimeError("Could not read column headers; grid structure may have changed.")
 
-        browser.close()
+            await _prepare_first_page(page)
 
-    # Write CSV + JSONL
-    with open(out_csv, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=list(Row().to_dict().keys()))
-        writer.writeheader()
-        for r in all_rows:
-            writer.writerow(r.to_dict())
+            total = await _get_total_from_pager(page) or 0
 
-    with open(out_jsonl, "w", encoding="utf-8") as f:
-        for r in all_rows:
-            f.write(json.dumps(r.to_dict(), ensure_ascii=False) + "\n")
+            # Decide between the captured feed and the DOM once; stop inspecting responses after
+            use_api = bool(api_rows) and _api_rows_match_grid(
+                api_rows, await _harvest_rows(grid, header_map), header_map, total)
+            page.remove_listener("response", on_response)
 
-    print(f"Saved {len(all_rows)} rows to {out_csv} and {out_jsonl}")
-    return len(all_rows)
+            done = False
+            if use_api:
+                # Full dataset already arrived over the wire; no DOM walking needed
+                write_rows(_extract_rows(api_rows, seen_products))
+                done = True
+            else:
+                # Page through the whole grid in one renderer-side call
+                try:
+                    raw_all, done = await _harvest_all_pages(grid, header_map, locators)
+                    write_rows(_extract_rows(raw_all, seen_products))
+                except Exception as e:
+                    # Rows that pass collected died with it; restart from page 1 so none are skipped
+                    print(f"In-browser pagination failed ({e}); restarting from page 1 with stepwise paging")
+                    await _goto_products(page)
+                    await _prepare_first_page(page)
+
+            if not done:
+                # Stepwise fallback: resumes from whatever page the grid is on now (page 1
+                # after a failed in-browser pass; otherwise everything before it is written)
+                # Harvest the current page (raw cell dicts; dedupe happens in Python)
+                async def harvest_current():
+                    nonlocal grid
+                    await _scroll_grid_to_end(page)
+                    grid = await _find_grid(page, locators) or grid
+                    return await _harvest_rows(grid, header_map)
+
+                # Click Next until disabled. The pager is arrow-only (no page index in
+                # the URL), so pages can't be fetched in parallel; instead the click for
+                # page N+1 is in flight while page N is deduped and written.
+                safety = 0
+                while True:
+                    raw = await harvest_current()
+                    next_btn = await _pager_next_btn(page, locators)
+                    advancing = None
+                    if next_btn and not await _is_disabled(next_btn) and safety < 100:  # guard
+                        safety += 1
+                        before = await _grid_snapshot(page)
+                        advancing = asyncio.create_task(_advance_page(page, next_btn, before))
+                        await asyncio.sleep(0)  # let the task dispatch the click before we write
+                    write_rows(_extract_rows(raw, seen_products))
+                    if advancing is None:
+                        break
+                    if not await advancing:
+                        print("Grid did not change after clicking Next; stopping pagination")
+                        break
+                    if total and len(seen_products) >= total:
+                        break
+
+            try: await ctx.storage_state(path=STATE_PATH)
+            except Exception: pass
+            await browser.close()
+
+    os.replace(csv_part, out_csv)
+    os.replace(jsonl_part, out_jsonl)
+    print(f"Saved {written} rows to {out_csv} and {out_jsonl}")
+    return written
+
+def run(headless: bool = True,
+        out_csv: str = "output/niap_products.csv",
+        out_jsonl: str = "output/niap_products.jsonl") -> int:
+    return asyncio.run(run_async(headless=headless, out_csv=out_csv, out_jsonl=out_jsonl))
 
 if __name__ == "__main__":
     headless = os.environ.get("HEADLESS", "1") != "0"
     out_csv  = os.environ.get("OUT_CSV", "output/niap_products.csv")
     out_jsonl = os.environ.get("OUT_JSONL", "output/niap_products.jsonl")
     run(headless=headless, out_csv=out_csv, out_jsonl=out_jsonl)
-
-